@@ -1,41 +1,171 @@
-"""Configurações do projeto carregadas de variáveis de ambiente."""
+"""Configurações do projeto carregadas de variáveis de ambiente.
+
+As variáveis são lidas uma única vez por processo em ``get_settings()``.
+Os nomes em nível de módulo (``config.WEBHOOK_PORT`` etc.) continuam
+funcionando via ``__getattr__`` (PEP 562), que repassa para o singleton.
+"""
 
 import os
-from dotenv import load_dotenv
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from pathlib import Path
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Configurações imutáveis do processo."""
+
+    # ──────────────────────── WhatsApp Business Cloud API ────────────────────────
+    WHATSAPP_ACCESS_TOKEN: str
+    WHATSAPP_PHONE_NUMBER_ID: str
+    WHATSAPP_VERIFY_TOKEN: str
+    WHATSAPP_APP_SECRET: str
+
+    # ──────────────────────── Google Gemini ────────────────────────
+    GOOGLE_GEMINI_API_KEY: str
+
+    # Modelos Gemini (editáveis via .env)
+    GEMINI_TRANSCRIPTION_MODEL: str
+    GEMINI_IMAGE_MODEL: str
+    GEMINI_VIDEO_MODEL: str
+    GEMINI_TTS_MODEL: str
+    GEMINI_TTS_VOICE: str
+
+    # ──────────────────────── Google Cloud Vision API ────────────────────────
+    GOOGLE_CLOUD_API_KEY: str
+
+    # ──────────────────────── Fact-checking API ────────────────────────
+    FACT_CHECK_API_URL: str
+
+    # ──────────────────────── Bot (grupo — desativado por enquanto) ────────────────────────
+    # BOT_MENTION_JID: str
+
+    # ──────────────────────── Servidor ────────────────────────
+    WEBHOOK_PORT: int
+    LOG_LEVEL: str
+    UVICORN_WORKERS: int
+    WORKER_CONCURRENCY: int
+    # Execuções simultâneas do grafo somando todos os workers (Gemini/fact-check)
+    MAX_CONCURRENT_RUNS: int
+    QUEUE_MAX_SIZE: int
+    # Descarta eventos de status (sent/delivered/read) sem parsear o JSON
+    SKIP_STATUS_EVENTS: bool
+
+    # ──────────────────────── Redis (opcional) ────────────────────────
+    # Deduplicação compartilhada entre workers/réplicas; vazio = em memória
+    REDIS_URL: str
+    # Fila durável no Redis (sobrevive a crash/restart); requer REDIS_URL
+    REDIS_QUEUE: bool
+    # Execuções simultâneas do grafo somando todos os processos/réplicas
+    # (semáforo no Redis); 0 = só o limite por processo
+    REDIS_MAX_CONCURRENT_RUNS: int
+
+    # ──────────────────────── Derivados ────────────────────────
+    # Calculados uma vez em __post_init__ a partir dos campos acima.
+    WHATSAPP_API_BASE_URL: str = field(init=False)
+
+    def __post_init__(self) -> None:
+        # Dataclass congelada + slots: cached_property não é suportado
+        object.__setattr__(
+            self,
+            "WHATSAPP_API_BASE_URL",
+            f"https://graph.facebook.com/v22.0/{self.WHATSAPP_PHONE_NUMBER_ID}",
+        )
+
+
+def _find_dotenv() -> Path | None:
+    """Procura o .env no diretório do projeto e depois nos diretórios pais.
+
+    Mesma busca do ``find_dotenv()`` do python-dotenv (que o
+    ``load_dotenv()`` sem argumentos usa), sem precisar importá-lo.
+    """
+    here = Path(__file__).resolve().parent
+    for directory in (here, *here.parents):
+        candidate = directory / ".env"
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+@lru_cache(maxsize=1)
+def _load_env() -> None:
+    """Lê o arquivo .env uma única vez por processo.
+
+    Separado de get_settings() para que recriar as configurações
+    (``get_settings.cache_clear()``) não volte a parsear o arquivo.
+    Em produção (variáveis já exportadas pelo orquestrador, sem .env ou com
+    SKIP_DOTENV definido) o python-dotenv nem chega a ser importado.
+    """
+    if os.getenv("SKIP_DOTENV"):
+        return
+    dotenv_path = _find_dotenv()
+    if dotenv_path is None:
+        return
+
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path)
+
 
-load_dotenv()
+def _uvicorn_workers() -> int:
+    """Número de processos do uvicorn.
 
-# ──────────────────────── WhatsApp Business Cloud API ────────────────────────
-WHATSAPP_ACCESS_TOKEN = os.getenv("WHATSAPP_ACCESS_TOKEN", "")
-WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID", "")
-WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "")
-WHATSAPP_APP_SECRET = os.getenv("WHATSAPP_APP_SECRET", "")
+    WEB_CONCURRENCY é a variável padrão do uvicorn/PaaS; 1 por padrão porque
+    fila e deduplicação são por processo (use REDIS_URL com mais de um).
+    "auto" usa um processo por CPU disponível para este processo.
+    """
+    value = os.getenv("UVICORN_WORKERS", os.getenv("WEB_CONCURRENCY", "1"))
+    if value.strip().lower() != "auto":
+        return int(value)
+    # sched_getaffinity respeita cpusets/limites do container (só Linux)
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
 
-WHATSAPP_API_BASE_URL = (
-    f"https://graph.facebook.com/v22.0/{WHATSAPP_PHONE_NUMBER_ID}"
-)
 
-# ──────────────────────── Google Gemini ────────────────────────
-GOOGLE_GEMINI_API_KEY = os.getenv("GOOGLE_GEMINI_API_KEY", "")
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Carrega o .env e as variáveis de ambiente uma única vez."""
+    _load_env()
 
-# Modelos Gemini (editáveis via .env)
-GEMINI_TRANSCRIPTION_MODEL = os.getenv("GEMINI_TRANSCRIPTION_MODEL", "gemini-3-flash-preview")
-GEMINI_IMAGE_MODEL = os.getenv("GEMINI_IMAGE_MODEL", "gemini-3-flash-preview")
-GEMINI_VIDEO_MODEL = os.getenv("GEMINI_VIDEO_MODEL", "gemini-3-flash-preview")
-GEMINI_TTS_MODEL = os.getenv("GEMINI_TTS_MODEL", "gemini-2.5-flash-preview-tts")
-GEMINI_TTS_VOICE = os.getenv("GEMINI_TTS_VOICE", "Kore")
+    return Settings(
+        WHATSAPP_ACCESS_TOKEN=os.getenv("WHATSAPP_ACCESS_TOKEN", ""),
+        WHATSAPP_PHONE_NUMBER_ID=os.getenv("WHATSAPP_PHONE_NUMBER_ID", ""),
+        WHATSAPP_VERIFY_TOKEN=os.getenv("WHATSAPP_VERIFY_TOKEN", ""),
+        WHATSAPP_APP_SECRET=os.getenv("WHATSAPP_APP_SECRET", ""),
+        GOOGLE_GEMINI_API_KEY=os.getenv("GOOGLE_GEMINI_API_KEY", ""),
+        GEMINI_TRANSCRIPTION_MODEL=os.getenv(
+            "GEMINI_TRANSCRIPTION_MODEL", "gemini-3-flash-preview"
+        ),
+        GEMINI_IMAGE_MODEL=os.getenv("GEMINI_IMAGE_MODEL", "gemini-3-flash-preview"),
+        GEMINI_VIDEO_MODEL=os.getenv("GEMINI_VIDEO_MODEL", "gemini-3-flash-preview"),
+        GEMINI_TTS_MODEL=os.getenv("GEMINI_TTS_MODEL", "gemini-2.5-flash-preview-tts"),
+        GEMINI_TTS_VOICE=os.getenv("GEMINI_TTS_VOICE", "Kore"),
+        GOOGLE_CLOUD_API_KEY=os.getenv("GOOGLE_CLOUD_API_KEY", ""),
+        FACT_CHECK_API_URL=os.getenv(
+            "FACT_CHECK_API_URL",
+            "https://ta-certo-isso-ai-767652480333.southamerica-east1.run.app",
+        ),
+        # BOT_MENTION_JID=os.getenv("BOT_MENTION_JID", "117558187450509@lid"),
+        WEBHOOK_PORT=int(os.getenv("WEBHOOK_PORT", "5000")),
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO").upper(),
+        UVICORN_WORKERS=_uvicorn_workers(),
+        WORKER_CONCURRENCY=int(os.getenv("WORKER_CONCURRENCY", "8")),
+        MAX_CONCURRENT_RUNS=int(os.getenv("MAX_CONCURRENT_RUNS", "20")),
+        QUEUE_MAX_SIZE=int(os.getenv("QUEUE_MAX_SIZE", "1000")),
+        SKIP_STATUS_EVENTS=os.getenv("SKIP_STATUS_EVENTS", "true").lower()
+        in ("1", "true", "yes"),
+        REDIS_URL=os.getenv("REDIS_URL", ""),
+        REDIS_QUEUE=os.getenv("REDIS_QUEUE", "false").lower() in ("1", "true", "yes"),
+        REDIS_MAX_CONCURRENT_RUNS=int(os.getenv("REDIS_MAX_CONCURRENT_RUNS", "0")),
+    )
 
-# ──────────────────────── Google Cloud Vision API ────────────────────────
-GOOGLE_CLOUD_API_KEY = os.getenv("GOOGLE_CLOUD_API_KEY", "")
 
-# ──────────────────────── Fact-checking API ────────────────────────
-FACT_CHECK_API_URL = os.getenv(
-    "FACT_CHECK_API_URL",
-    "https://ta-certo-isso-ai-767652480333.southamerica-east1.run.app",
-)
+_SETTINGS_FIELDS = frozenset(f.name for f in fields(Settings))
 
-# ──────────────────────── Bot (grupo — desativado por enquanto) ────────────────────────
-# BOT_MENTION_JID = os.getenv("BOT_MENTION_JID", "117558187450509@lid")
 
-# ──────────────────────── Servidor ────────────────────────
-WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "5000"))
+def __getattr__(name: str):
+    """Compatibilidade: ``config.NOME`` repassa para ``get_settings().NOME``."""
+    if name in _SETTINGS_FIELDS:
+        return getattr(get_settings(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
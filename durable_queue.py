@@ -0,0 +1,184 @@
+"""Fila durável de webhooks no Redis (opcional, REDIS_QUEUE=true).
+
+O webhook grava o payload numa lista do Redis antes do ACK; um alimentador
+por processo move cada item (BLMOVE, atômico) para a lista de processamento
+do próprio consumidor e o entrega à fila local dos workers. O item só sai do
+Redis depois de processado (``ack``), então um crash no meio do caminho não
+perde a mensagem: quando o heartbeat do consumidor expira, ``reap`` devolve
+os itens da lista de processamento dele para a fila principal.
+
+Formato do item: ``orjson(mensagens) + b"\\n" + payload cru``. O JSON das
+referências gerado pelo orjson nunca contém quebra de linha, então o
+primeiro ``\\n`` separa as duas partes sem ambiguidade.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+_QUEUE_KEY = "whatsapp:webhook:queue"
+_PROCESSING_PREFIX = "whatsapp:webhook:processing:"
+_CONSUMER_PREFIX = "whatsapp:webhook:consumer:"
+
+# Heartbeat do consumidor: renovado por uma task própria; ao expirar, os itens
+# em processamento dele voltam para a fila
+_CONSUMER_TTL_SECONDS = 30
+_HEARTBEAT_INTERVAL = 10.0
+# Espera (s) do BLMOVE no servidor por um item; também a pausa após erro
+_BLOCK_TIMEOUT = 1
+# Intervalo (s) entre varreduras de consumidores mortos
+_REAP_INTERVAL = 60.0
+
+
+def encode_item(payload: bytes, messages: list) -> bytes:
+    """Serializa um webhook aceito (referências + payload cru)."""
+    return orjson.dumps(messages) + b"\n" + payload
+
+
+def decode_item(raw: bytes) -> tuple[bytes, list[tuple]]:
+    """Inverso de ``encode_item``."""
+    head, payload = raw.split(b"\n", 1)
+    return payload, [tuple(ref) for ref in orjson.loads(head)]
+
+
+class DurableQueue:
+    """Fila confiável sobre listas do Redis (padrão BLMOVE + lista de processamento)."""
+
+    def __init__(self, redis, feeder_redis) -> None:
+        # feeder_redis: cliente só do BLMOVE, com timeout de leitura maior
+        # que _BLOCK_TIMEOUT (o cliente principal usa timeouts curtos)
+        self._redis = redis
+        self._feeder_redis = feeder_redis
+        # Sufixo aleatório por início: um container reiniciado mantém hostname
+        # e PID (PID 1), e com o mesmo id nunca recuperaria a própria lista
+        run_id = uuid.uuid4().hex[:8]
+        self.consumer = f"{socket.gethostname()}:{os.getpid()}:{run_id}"
+        self._processing_key = _PROCESSING_PREFIX + self.consumer
+        self._consumer_key = _CONSUMER_PREFIX + self.consumer
+        self._heartbeat_task: asyncio.Task | None = None
+
+        # Import local: o redis só é carregado quando a fila durável é usada
+        from redis.exceptions import ConnectionError as RedisConnectionError
+
+        # Falha de push que permite gravar o webhook em outro lugar (ver push)
+        self.connection_error = RedisConnectionError
+
+    async def push(self, payload: bytes, messages: list) -> None:
+        """Grava o webhook na fila principal (chamado antes do ACK).
+
+        Só ``connection_error`` indica que o LPUSH não chegou ao servidor. Um
+        timeout pode ter sido aplicado mesmo sem resposta: gravar o mesmo
+        webhook também na fila local faria a mensagem ser processada duas
+        vezes.
+        """
+        await self._redis.lpush(_QUEUE_KEY, encode_item(payload, messages))
+
+    async def heartbeat(self) -> None:
+        await self._redis.set(self._consumer_key, b"1", ex=_CONSUMER_TTL_SECONDS)
+
+    async def start(self) -> None:
+        """Registra o consumidor e mantém o heartbeat numa task própria.
+
+        Separado do ``feed``: o alimentador fica parado no ``put`` com a fila
+        local cheia (carga alta ou consumo pausado), e o heartbeat não pode
+        expirar nesse meio-tempo, senão outra réplica recuperaria itens que
+        este processo ainda vai processar.
+        """
+        await self.heartbeat()
+        self._heartbeat_task = asyncio.create_task(
+            self._heartbeat_forever(), name="redis-heartbeat"
+        )
+
+    async def _heartbeat_forever(self) -> None:
+        while True:
+            await asyncio.sleep(_HEARTBEAT_INTERVAL)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.warning("Falha ao renovar heartbeat no Redis: %s", e)
+
+    async def feed(self, local_queue: asyncio.Queue) -> None:
+        """Move itens do Redis para a fila local dos workers (loop infinito).
+
+        Cada item entra na fila local como ``(payload, mensagens, raw)``; o
+        ``raw`` é o recibo usado em ``ack``. O ``put`` bloqueante faz a fila
+        local cheia segurar o consumo do Redis (backpressure).
+        """
+        while True:
+            try:
+                raw = await self._feeder_redis.blmove(
+                    _QUEUE_KEY,
+                    self._processing_key,
+                    _BLOCK_TIMEOUT,
+                    src="RIGHT",
+                    dest="LEFT",
+                )
+                if raw is None:
+                    continue
+
+                try:
+                    payload, messages = decode_item(raw)
+                except Exception:
+                    logger.exception("Item inválido na fila do Redis, descartando")
+                    await self._redis.lrem(self._processing_key, 1, raw)
+                    continue
+
+                await local_queue.put((payload, messages, raw))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Falha ao ler a fila do Redis: %s", e)
+                await asyncio.sleep(_BLOCK_TIMEOUT)
+
+    async def ack(self, receipts: list[bytes]) -> None:
+        """Remove do Redis os itens já processados."""
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for raw in receipts:
+                    pipe.lrem(self._processing_key, 1, raw)
+                await pipe.execute()
+        except Exception as e:
+            # Sem o ack o item volta à fila quando este consumidor morrer
+            logger.warning("Falha ao confirmar itens no Redis: %s", e)
+
+    async def reap(self) -> int:
+        """Devolve à fila os itens de consumidores sem heartbeat."""
+        recovered = 0
+        async for key in self._redis.scan_iter(match=_PROCESSING_PREFIX + "*"):
+            key = key.decode() if isinstance(key, bytes) else key
+            consumer = key[len(_PROCESSING_PREFIX) :]
+            if consumer == self.consumer:
+                continue
+            if await self._redis.exists(_CONSUMER_PREFIX + consumer):
+                continue
+            # Mais antigo termina na ponta direita: é o próximo a ser lido
+            while await self._redis.lmove(key, _QUEUE_KEY, "LEFT", "RIGHT"):
+                recovered += 1
+        if recovered:
+            logger.warning("%d webhooks recuperados de consumidores mortos", recovered)
+        return recovered
+
+    async def reap_forever(self) -> None:
+        while True:
+            await asyncio.sleep(_REAP_INTERVAL)
+            try:
+                await self.reap()
+            except Exception as e:
+                logger.warning("Falha ao recuperar itens do Redis: %s", e)
+
+    async def close(self) -> None:
+        """Encerra o consumidor: sem heartbeat, o que sobrou é recuperado logo."""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            await asyncio.gather(self._heartbeat_task, return_exceptions=True)
+        try:
+            await self._redis.delete(self._consumer_key)
+        except Exception as e:
+            logger.warning("Falha ao remover heartbeat do Redis: %s", e)
+        await self._feeder_redis.aclose()
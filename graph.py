@@ -10,172 +10,141 @@ Fluxo DM:
 """
 
 import logging
+from collections.abc import Callable
+from functools import lru_cache
 
 from langgraph.graph import END, StateGraph
 
-from nodes.data_extractor import extract_data
-from nodes.filters import (
-    check_greeting,
-    check_initial_message,
-    check_is_on_group,
-    route_greeting,
-    route_initial_message,
-    route_is_on_group,
-    # ── Grupo (comentado) ──
-    # check_is_mention_of_bot,
-    # check_response_to_message,
-    # route_is_mention_of_bot,
-    # route_response_to_message,
-)
-from nodes.media_processor import (
-    process_audio,
-    process_image,
-    process_text,
-    process_video,
-    # ── Grupo (comentado) ──
-    # process_quoted_audio,
-    # process_quoted_image,
-    # process_quoted_text,
-    # process_quoted_video,
-)
-from nodes.response_sender import (
-    handle_document_unsupported,
-    handle_greeting,
-    mark_as_read_node,
-    send_audio_response,
-    send_rationale_text,
-)
-from nodes.router import (
-    route_direct_message,
-    # ── Grupo (comentado) ──
-    # detect_quoted_message_type,
-    # route_quoted_message,
-)
 from state import WorkflowState
 
 logger = logging.getLogger(__name__)
 
+# Roteamento pós-rationale (constantes avaliadas uma vez)
+# Tipos da Cloud API: 'audio' (em vez de 'audioMessage' da Evolution API).
+_AUDIO_TYPES = frozenset({"audio"})
+_AUDIO_NODE = "send_audio_response"
 
-def build_graph() -> StateGraph:
-    """Constrói e retorna o grafo LangGraph do workflow."""
-    graph = StateGraph(WorkflowState)
 
-    # ─── Nós de extração e filtragem ───
-    graph.add_node("extract_data", extract_data)
-    graph.add_node("check_is_on_group", check_is_on_group)
-    graph.add_node("check_initial_message", check_initial_message)
-    graph.add_node("check_greeting", check_greeting)
+def _route_after_rationale(state: WorkflowState) -> str:
+    """Após enviar o rationale, verifica se deve gerar áudio.
 
-    # ── Nós de grupo (comentados) ──
-    # graph.add_node("is_mention_of_bot", check_is_mention_of_bot)
-    # graph.add_node("check_response_to_message", check_response_to_message)
+    O áudio é gerado apenas quando a mensagem original era de áudio
+    e há rationale para narrar.
+    """
+    if state.get("tipo_mensagem") in _AUDIO_TYPES and state.get("rationale"):
+        return _AUDIO_NODE
+    return END
 
-    # ─── Nós de marcar como lida e saudação ───
-    graph.add_node("mark_as_read_initial", mark_as_read_node)
-    graph.add_node("mark_as_read_direct", mark_as_read_node)
-    graph.add_node("handle_greeting", handle_greeting)
 
-    # ── Nó de grupo (comentado) ──
-    # graph.add_node("mark_as_read_quoted", mark_as_read_node)
-    # graph.add_node("detect_quoted_type", detect_quoted_message_type)
+# ════════════════════════════════════
+#  TABELAS DO GRAFO
+# ════════════════════════════════════
+# Nós e roteadores são referenciados pelo nome exportado em ``nodes``
+# (resolvido de forma preguiçosa em build_graph) ou diretamente pela função.
 
-    # ─── Nós de processamento direto (Switch6) ───
-    graph.add_node("process_audio", process_audio)
-    graph.add_node("process_text", process_text)
-    graph.add_node("process_image", process_image)
-    graph.add_node("process_video", process_video)
+_ENTRY_POINT = "extract_data"
 
+_NODES: tuple[tuple[str, str], ...] = (
+    # ─── Nós de extração e filtragem ───
+    ("extract_data", "extract_data"),
+    ("check_is_on_group", "check_is_on_group"),
+    ("check_initial_message", "check_initial_message"),
+    ("check_greeting", "check_greeting"),
+    # ── Nós de grupo (comentados) ──
+    # ("is_mention_of_bot", "check_is_mention_of_bot"),
+    # ("check_response_to_message", "check_response_to_message"),
+    # ─── Nós de marcar como lida e saudação ───
+    ("mark_as_read_initial", "mark_as_read_node"),
+    ("mark_as_read_direct", "mark_as_read_node"),
+    ("handle_greeting", "handle_greeting"),
+    # ── Nós de grupo (comentados) ──
+    # ("mark_as_read_quoted", "mark_as_read_node"),
+    # ("detect_quoted_type", "detect_quoted_message_type"),
+    # ─── Nós de processamento direto (Switch6) ───
+    ("process_audio", "process_audio"),
+    ("process_text", "process_text"),
+    ("process_image", "process_image"),
+    ("process_video", "process_video"),
     # ── Nós de grupo (comentados) — processamento quoted (Switch9) ──
-    # graph.add_node("process_quoted_audio", process_quoted_audio)
-    # graph.add_node("process_quoted_text", process_quoted_text)
-    # graph.add_node("process_quoted_image", process_quoted_image)
-    # graph.add_node("process_quoted_video", process_quoted_video)
-
+    # ("process_quoted_audio", "process_quoted_audio"),
+    # ("process_quoted_text", "process_quoted_text"),
+    # ("process_quoted_image", "process_quoted_image"),
+    # ("process_quoted_video", "process_quoted_video"),
     # ─── Nós de resposta ───
-    graph.add_node("handle_document_unsupported", handle_document_unsupported)
-    graph.add_node("send_rationale_text", send_rationale_text)
-    graph.add_node("send_audio_response", send_audio_response)
-
-    # ════════════════════════════════════
-    #  ARESTAS — Caminho DM
-    # ════════════════════════════════════
+    ("handle_document_unsupported", "handle_document_unsupported"),
+    ("send_rationale_text", "send_rationale_text"),
+    ("send_audio_response", "send_audio_response"),
+)
 
+_EDGES: tuple[tuple[str, str], ...] = (
     # Entrada → Extrair dados → Verificar grupo
-    graph.set_entry_point("extract_data")
-    graph.add_edge("extract_data", "check_is_on_group")
+    ("extract_data", "check_is_on_group"),
+    # Saudação / mensagem inicial → END
+    ("mark_as_read_initial", END),
+    ("handle_greeting", END),
+    # Processamento direto (Switch6) → Resposta
+    ("process_audio", "send_rationale_text"),
+    ("process_text", "send_rationale_text"),
+    ("process_image", "send_rationale_text"),
+    ("process_video", "send_rationale_text"),
+    # Documento não suportado → END
+    ("handle_document_unsupported", END),
+    # Enviar áudio → END
+    ("send_audio_response", END),
+    # ── Caminho GRUPO (comentado) ──
+    # ("mark_as_read_quoted", "detect_quoted_type"),
+    # ("process_quoted_audio", "send_rationale_text"),
+    # ("process_quoted_text", "send_rationale_text"),
+    # ("process_quoted_image", "send_rationale_text"),
+    # ("process_quoted_video", "send_rationale_text"),
+)
 
+_CONDITIONAL: tuple[tuple[str, str | Callable[[WorkflowState], str]], ...] = (
     # isOnGroup → (grupo) END | (direto) check_initial_message
-    graph.add_conditional_edges("check_is_on_group", route_is_on_group)
-
-    # ── Caminho DIRETO (DM) ──
-    # check_initial_message → (sim) mark_as_read_initial (END) | (não) check_greeting
-    graph.add_conditional_edges("check_initial_message", route_initial_message)
-    graph.add_edge("mark_as_read_initial", END)
-
-    # check_greeting → (sim) handle_greeting (END) | (não) mark_as_read_direct → Switch6
-    graph.add_conditional_edges("check_greeting", route_greeting)
-    graph.add_edge("handle_greeting", END)
-
+    ("check_is_on_group", "route_is_on_group"),
+    # check_initial_message → (sim) mark_as_read_initial | (não) check_greeting
+    ("check_initial_message", "route_initial_message"),
+    # check_greeting → (sim) handle_greeting | (não) mark_as_read_direct
+    ("check_greeting", "route_greeting"),
     # mark_as_read_direct → Switch6 (roteamento por tipo de mensagem)
-    graph.add_conditional_edges("mark_as_read_direct", route_direct_message)
-
-    # ── Processamento direto (Switch6) → Resposta ──
-    graph.add_edge("process_audio", "send_rationale_text")
-    graph.add_edge("process_text", "send_rationale_text")
-    graph.add_edge("process_image", "send_rationale_text")
-    graph.add_edge("process_video", "send_rationale_text")
-
-    # ── Documento não suportado → END ──
-    graph.add_edge("handle_document_unsupported", END)
-
-    # ── Enviar rationale texto → Verificar se precisa enviar áudio ──
-    graph.add_conditional_edges(
-        "send_rationale_text",
-        _route_after_rationale,
-    )
-
-    # ── Enviar áudio → END ──
-    graph.add_edge("send_audio_response", END)
-
-    # ════════════════════════════════════
-    #  ARESTAS — Caminho GRUPO (comentado)
-    # ════════════════════════════════════
-
-    # # isMentionOfTheBot → (sim) check_response_to_message | (não) END
-    # graph.add_conditional_edges("is_mention_of_bot", route_is_mention_of_bot)
-    #
-    # # isResponseToMessage → (sim) mark_as_read_quoted | (não) mark_as_read_direct
-    # graph.add_conditional_edges(
-    #     "check_response_to_message", route_response_to_message
-    # )
-    #
-    # # Quoted path: mark_as_read_quoted → detect_quoted_type → route_quoted_message
-    # graph.add_edge("mark_as_read_quoted", "detect_quoted_type")
-    # graph.add_conditional_edges("detect_quoted_type", route_quoted_message)
-    #
-    # # Processamento quoted (Switch9) → Resposta
-    # graph.add_edge("process_quoted_audio", "send_rationale_text")
-    # graph.add_edge("process_quoted_text", "send_rationale_text")
-    # graph.add_edge("process_quoted_image", "send_rationale_text")
-    # graph.add_edge("process_quoted_video", "send_rationale_text")
+    ("mark_as_read_direct", "route_direct_message"),
+    # Enviar rationale texto → Verificar se precisa enviar áudio
+    ("send_rationale_text", _route_after_rationale),
+    # ── Caminho GRUPO (comentado) ──
+    # ("is_mention_of_bot", "route_is_mention_of_bot"),
+    # ("check_response_to_message", "route_response_to_message"),
+    # ("detect_quoted_type", "route_quoted_message"),
+)
 
-    return graph
 
+def build_graph() -> StateGraph:
+    """Constrói e retorna o grafo LangGraph do workflow a partir das tabelas."""
+    # Import local: os submódulos de nós (Gemini, httpx, pydub...) só são
+    # carregados quando o grafo é de fato construído.
+    import nodes
 
-def _route_after_rationale(state: WorkflowState) -> str:
-    """Após enviar o rationale, verifica se deve gerar áudio.
+    def resolve(ref):
+        return getattr(nodes, ref) if isinstance(ref, str) else ref
 
-    O áudio é gerado apenas quando a mensagem original era de áudio.
-    Tipos da Cloud API: 'audio' (em vez de 'audioMessage' da Evolution API).
-    """
-    tipo = state.get("tipo_mensagem", "")
+    graph = StateGraph(WorkflowState)
 
-    if tipo == "audio":
-        return "send_audio_response"
-    return "__end__"
+    for name, ref in _NODES:
+        graph.add_node(name, resolve(ref))
+    for source, target in _EDGES:
+        graph.add_edge(source, target)
+    for source, router in _CONDITIONAL:
+        graph.add_conditional_edges(source, resolve(router))
+
+    graph.set_entry_point(_ENTRY_POINT)
+    return graph
 
 
+@lru_cache(maxsize=1)
 def compile_graph():
-    """Compila o grafo LangGraph e retorna o executor."""
+    """Compila o grafo LangGraph e retorna o executor.
+
+    O resultado é memorizado: chamadas repetidas (workers, reload)
+    reutilizam o mesmo executor compilado.
+    """
     graph = build_graph()
     return graph.compile()
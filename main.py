@@ -6,21 +6,39 @@ Endpoints:
 - GET  /health   → Health check
 """
 
-import hashlib
+import asyncio
+import binascii
 import hmac
 import logging
-
-import uvicorn
-from fastapi import BackgroundTasks, FastAPI, Query, Request
-from fastapi.responses import JSONResponse, PlainTextResponse
-
-import config
+import signal
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import msgspec
+import orjson
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import PlainTextResponse
+
+from config import get_settings
+from durable_queue import DurableQueue
 from graph import compile_graph
+from nodes import whatsapp_api
+from redis_semaphore import RedisSemaphore
+from webhook_schema import Message, WebhookBody, decoder
 
 # ──────────────────────── Logging ────────────────────────
 
+# Logs por mensagem ficam em DEBUG; INFO registra só início/parada e
+# eventos relevantes. Em produção, LOG_LEVEL=WARNING corta também esses.
+# O formato não usa thread/processo: evita resolvê-los a cada registro.
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
 logging.basicConfig(
-    level=logging.INFO,
+    level=get_settings().LOG_LEVEL,
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
 )
@@ -28,79 +46,580 @@ logger = logging.getLogger(__name__)
 
 # ──────────────────────── App ────────────────────────
 
-app = FastAPI(
-    title="TaCertoIssoAI - Fake News Detector",
-    description="Bot de detecção de fake news para WhatsApp via LangGraph",
-    version="2.0.0",
-)
 
-# Compila o grafo uma vez na inicialização
-workflow = compile_graph()
+class JSONBytesResponse(Response):
+    """Resposta JSON serializada com orjson (bytes direto, sem str).
+
+    Substitui o ORJSONResponse do FastAPI, depreciado (emite aviso a cada
+    resposta nas versões recentes).
+    """
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+# Compilado no startup de cada processo (ver lifespan), para que cada
+# worker do uvicorn tenha o seu próprio executor.
+workflow = None
+
+
+# Marcadores para descartar eventos de status sem parsear o JSON.
+# Dentro de strings JSON as aspas vêm escapadas (\"), então não há falso
+# positivo vindo do texto de uma mensagem.
+_STATUSES_MARKER = b'"statuses"'
+_MESSAGES_MARKER = b'"messages"'
+
+
+def _is_status_only(payload: bytes) -> bool:
+    """Indica se o payload só contém eventos de status (sem mensagens)."""
+    return _STATUSES_MARKER in payload and _MESSAGES_MARKER not in payload
+
+
+# ──────────────────────── Deduplicação ────────────────────────
+
+# A Meta reenvia o webhook quando não recebe o 200 a tempo; o id da mensagem
+# (wamid) identifica reentregas. Com REDIS_URL configurado a deduplicação é
+# compartilhada (SET NX EX); sem Redis, fica num cache em memória do processo.
+_DEDUP_TTL_SECONDS = 300
+_MAX_DEDUP_ENTRIES = 10000
+# Intervalo (s) da varredura de entradas expiradas em background
+_DEDUP_SWEEP_INTERVAL = 60.0
+
+# Cliente Redis (criado no startup_event quando REDIS_URL está definido)
+_redis = None
+
+# Timeout (s) de conexão e leitura do Redis. A deduplicação roda no caminho
+# do ACK: sem limite, um Redis que não responde (sem recusar a conexão)
+# seguraria o webhook além do timeout da Meta em vez de cair no cache local.
+_REDIS_TIMEOUT = 0.5
+# O BLMOVE do alimentador da fila durável bloqueia até 1 s no servidor; o
+# cliente dele precisa de um timeout de leitura maior que isso
+_REDIS_FEEDER_TIMEOUT = 5.0
+
+# Cache local: ordem de inserção == ordem de chegada, então só o item mais
+# antigo precisa ser checado para expiração.
+_processed_messages: OrderedDict[str, float] = OrderedDict()
+
+
+async def _is_duplicate(message_id: str, now: float) -> bool:
+    """Indica se a mensagem já foi recebida nos últimos _DEDUP_TTL_SECONDS.
+
+    Com Redis é um único round-trip atômico: o SET só grava se a chave for
+    nova, e o TTL cuida da expiração. Se o Redis falhar, cai no cache local.
+    ``now`` (time.monotonic()) é lido uma vez por webhook pelo chamador: com
+    TTL de minutos, a diferença entre mensagens do mesmo webhook é irrelevante.
+    """
+    if _redis is not None:
+        try:
+            is_new = await _redis.set(
+                f"dedup:{message_id}", b"1", nx=True, ex=_DEDUP_TTL_SECONDS
+            )
+            return not is_new
+        except Exception as e:
+            logger.warning("Falha no Redis, usando deduplicação local: %s", e)
+
+    return _is_duplicate_local(message_id, now)
+
+
+def _is_duplicate_local(message_id: str, now: float) -> bool:
+    """Deduplicação em memória do processo.
+
+    Sem lock: só há operações síncronas de dict entre awaits, e o event
+    loop é single-threaded. A expiração em massa fica com _dedup_janitor;
+    aqui só se confere o TTL da própria mensagem.
+    """
+    seen_at = _processed_messages.get(message_id)
+    if seen_at is not None:
+        if now - seen_at <= _DEDUP_TTL_SECONDS:
+            return True
+        # Expirada mas ainda não varrida: volta ao fim da ordem de chegada
+        del _processed_messages[message_id]
+
+    if len(_processed_messages) >= _MAX_DEDUP_ENTRIES:
+        _processed_messages.popitem(last=False)
+    _processed_messages[message_id] = now
+    return False
+
+
+async def _dedup_janitor() -> None:
+    """Remove periodicamente as entradas expiradas do cache local.
+
+    A ordem de inserção é a de chegada: basta consumir a frente até achar
+    uma entrada dentro do TTL (O(expirados), nunca O(n)).
+    """
+    while True:
+        await asyncio.sleep(_DEDUP_SWEEP_INTERVAL)
+        now = time.monotonic()
+        while _processed_messages:
+            oldest_ts = next(iter(_processed_messages.values()))
+            if now - oldest_ts <= _DEDUP_TTL_SECONDS:
+                break
+            _processed_messages.popitem(last=False)
+
+
+async def _forget_messages(message_ids: list[str]) -> None:
+    """Remove mensagens da deduplicação (ex: recusadas com a fila cheia)."""
+    for message_id in message_ids:
+        _processed_messages.pop(message_id, None)
+
+    if _redis is not None and message_ids:
+        try:
+            await _redis.delete(*(f"dedup:{message_id}" for message_id in message_ids))
+        except Exception as e:
+            logger.warning("Falha ao limpar deduplicação no Redis: %s", e)
 
 
 # ──────────────────────── Validação de assinatura ────────────────────────
 
+# Segredos codificados uma vez (evita .encode() a cada requisição)
+_APP_SECRET_BYTES = get_settings().WHATSAPP_APP_SECRET.encode("utf-8")
+_VERIFY_TOKEN_BYTES = get_settings().WHATSAPP_VERIFY_TOKEN.encode("utf-8")
+
+# Header "X-Hub-Signature-256: sha256=<64 dígitos hex>"
+_SIGNATURE_HEADER_NAME = b"x-hub-signature-256"
+_SIGNATURE_PREFIX = b"sha256="
+_SIGNATURE_PREFIX_LEN = len(_SIGNATURE_PREFIX)
+_SIGNATURE_HEADER_LEN = _SIGNATURE_PREFIX_LEN + 64
+
+# HMAC já inicializado com a chave: cada requisição copia o protótipo e só
+# processa o payload, sem refazer o key schedule (ipad/opad) do App Secret.
+_HMAC_PROTO = (
+    hmac.new(_APP_SECRET_BYTES, digestmod="sha256") if _APP_SECRET_BYTES else None
+)
+
+# Acima deste tamanho o HMAC roda numa thread (o OpenSSL libera o GIL),
+# para não segurar o event loop e atrasar o ACK de outros webhooks.
+_HMAC_INLINE_MAX_BYTES = 64 * 1024
+
+
+def _hmac_sha256(payload: bytes) -> bytes:
+    """HMAC-SHA256 do payload com o App Secret (a partir do protótipo)."""
+    mac = _HMAC_PROTO.copy()
+    mac.update(payload)
+    return mac.digest()
 
-def _verify_signature(payload: bytes, signature_header: str) -> bool:
+
+def _get_signature_header(scope: dict) -> bytes:
+    """Lê o X-Hub-Signature-256 cru (bytes) direto dos headers ASGI.
+
+    Evita o MultiDict de Headers do Starlette e a decodificação para str.
+    Nomes de header no ASGI já vêm em minúsculas.
+    """
+    for header in scope["headers"]:
+        if header[0] == _SIGNATURE_HEADER_NAME:
+            return header[1]
+    return b""
+
+
+async def _verify_signature(payload: bytes, signature_header: bytes) -> bool:
     """Valida a assinatura X-Hub-Signature-256 do webhook.
 
     A Meta assina cada requisição com HMAC-SHA256 usando o App Secret.
     Se WHATSAPP_APP_SECRET não estiver configurado, pula a validação.
+    Payloads pequenos (a quase totalidade) são validados inline.
     """
-    app_secret = config.WHATSAPP_APP_SECRET
-    if not app_secret:
+    if not _APP_SECRET_BYTES:
         logger.warning("WHATSAPP_APP_SECRET não configurado — assinatura não validada")
         return True
 
-    if not signature_header:
+    # Formato: "sha256=<64 hex>". Cabeçalho malformado é rejeitado antes de
+    # calcular o HMAC sobre o payload (só depende do header, não vaza timing).
+    if (
+        len(signature_header) != _SIGNATURE_HEADER_LEN
+        or not signature_header.startswith(_SIGNATURE_PREFIX)
+    ):
         return False
 
-    # Formato: "sha256=<hex_digest>"
-    expected_signature = hmac.HMAC(
-        app_secret.encode("utf-8"),
-        payload,
-        hashlib.sha256,
-    ).hexdigest()
+    # Compara os 32 bytes crus do digest (hex decodificado direto dos bytes)
+    try:
+        received = binascii.a2b_hex(signature_header[_SIGNATURE_PREFIX_LEN:])
+    except binascii.Error:
+        return False
 
-    received = signature_header.removeprefix("sha256=")
-    return hmac.compare_digest(expected_signature, received)
+    if len(payload) > _HMAC_INLINE_MAX_BYTES:
+        expected = await asyncio.to_thread(_hmac_sha256, payload)
+    else:
+        expected = _hmac_sha256(payload)
+    return hmac.compare_digest(expected, received)
 
 
 # ──────────────────────── Processamento assíncrono ────────────────────────
 
+# Campos constantes do estado inicial (copiados a cada mensagem)
+_STATE_TEMPLATE: dict = {"endpoint_api": get_settings().FACT_CHECK_API_URL}
+
+# Localização de uma mensagem no payload + dados já extraídos pelo webhook:
+# (entry_idx, change_idx, msg_idx, message_id, sender)
+MessageRef = tuple[int, int, int, str, str]
+
+# Item da fila: bytes crus do webhook + mensagens a processar + recibo da
+# fila durável no Redis (None quando o item veio direto do webhook)
+QueuedWebhook = tuple[bytes, list[MessageRef], bytes | None]
+
+
+def _build_states(payload: bytes, messages: list[MessageRef]) -> list[dict]:
+    """Monta o estado inicial do grafo para cada mensagem de um webhook.
+
+    ``payload`` são os bytes crus do webhook: o dict completo só é montado
+    aqui, fora do caminho do ACK, e uma única vez para todas as mensagens.
+    """
+    body = orjson.loads(payload)
+
+    states = []
+    for entry_idx, change_idx, msg_idx, message_id, sender in messages:
+        logger.debug("[%s] Processando mensagem de %s", message_id, sender)
+        value = body["entry"][entry_idx]["changes"][change_idx]["value"]
+        initial_state = _STATE_TEMPLATE.copy()
+        # Mensagem e contatos por referência (o grafo só lê)
+        initial_state["message"] = value["messages"][msg_idx]
+        initial_state["contacts"] = value.get("contacts", [])
+        states.append(initial_state)
+    return states
+
 
-async def process_message(body: dict) -> None:
-    """Processa a mensagem recebida usando o grafo LangGraph."""
+async def _run_graph(state: dict) -> dict:
+    """Executa o grafo para uma mensagem, respeitando o limite global.
+
+    Com REDIS_MAX_CONCURRENT_RUNS, além da vaga local (por processo) é
+    preciso uma vaga no semáforo compartilhado entre processos/réplicas.
+    """
+    async with _graph_slots:
+        if _cluster_slots is None:
+            return await _invoke_workflow(state)
+        async with _cluster_slots.slot():
+            return await _invoke_workflow(state)
+
+
+async def _invoke_workflow(state: dict) -> dict:
+    global _running_graphs
+    _running_graphs += 1
     try:
-        initial_state = {
-            "raw_body": body,
-            "endpoint_api": config.FACT_CHECK_API_URL,
-        }
-
-        # Extrair informações básicas para log
-        value = (
-            body.get("entry", [{}])[0]
-            .get("changes", [{}])[0]
-            .get("value", {})
+        return await workflow.ainvoke(state)
+    finally:
+        _running_graphs -= 1
+
+
+async def process_message(batch: list[QueuedWebhook]) -> None:
+    """Processa as mensagens de um ou mais webhooks usando o grafo LangGraph.
+
+    As mensagens do lote rodam concorrentemente, mas no máximo
+    MAX_CONCURRENT_RUNS execuções do grafo ficam ativas somando todos os
+    workers. Um payload que falhe ao montar os estados não afeta os demais.
+    """
+    message_ids: list[str] = []
+    states: list[dict] = []
+    for payload, messages, _receipt in batch:
+        try:
+            states.extend(_build_states(payload, messages))
+        except Exception:
+            logger.exception("Erro ao processar webhook")
+            continue
+        message_ids.extend(ref[3] for ref in messages)
+
+    if not states:
+        return
+
+    results = await asyncio.gather(
+        *(_run_graph(state) for state in states), return_exceptions=True
+    )
+
+    for message_id, result in zip(message_ids, results):
+        if isinstance(result, BaseException):
+            logger.error(
+                "[%s] Erro ao processar mensagem",
+                message_id,
+                exc_info=result,
+            )
+        elif logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "[%s] Processamento concluído. Rationale: %s",
+                message_id,
+                "presente" if result.get("rationale") else "ausente",
+            )
+
+
+# ──────────────────────── Fila de processamento ────────────────────────
+
+# Fila limitada: o webhook só enfileira (ACK imediato) e N workers consomem,
+# limitando explicitamente a concorrência com Gemini/fact-check.
+# Criada no startup_event, dentro do event loop que vai consumi-la.
+_queue: asyncio.Queue[QueuedWebhook] | None = None
+# Limite global de execuções do grafo (o lote drenado por um worker não
+# multiplica a concorrência com as APIs externas)
+_graph_slots: asyncio.Semaphore | None = None
+# Limite somando todos os processos/réplicas (REDIS_MAX_CONCURRENT_RUNS)
+_cluster_slots: RedisSemaphore | None = None
+# Tasks de fundo (workers + janitor da deduplicação), canceladas no shutdown
+_worker_tasks: list[asyncio.Task] = []
+
+# Fila durável no Redis (REDIS_QUEUE) e a task que a transfere para _queue;
+# o alimentador é parado antes de drenar a fila no shutdown
+_durable: DurableQueue | None = None
+_feeder_task: asyncio.Task | None = None
+
+# Mensagens sendo processadas agora (lido pelo /health em O(1))
+_active_messages = 0
+# Execuções do grafo ocupando uma vaga de _graph_slots (sem ler o estado
+# interno do Semaphore); active_tasks - running = mensagens aguardando vaga
+_running_graphs = 0
+
+# Consumo da fila liberado (limpo por SIGUSR1, restaurado por SIGUSR2): pausa
+# os workers durante incidentes nas APIs externas sem perder o que está na
+# fila. Criado no startup_event.
+_consuming: asyncio.Event | None = None
+
+# Tempo máximo (s) para drenar a fila no shutdown antes de cancelar os workers
+_SHUTDOWN_DRAIN_TIMEOUT = 15.0
+
+# Máximo de payloads que um worker retira da fila por vez (rajadas)
+_WORKER_BATCH_SIZE = 32
+
+# Validade (s) de uma vaga no semáforo do Redis: cobre a execução mais longa
+# do grafo (vídeo) e libera vagas de processos que morreram sem devolvê-las
+_CLUSTER_SLOT_LEASE_SECONDS = 600
+
+
+async def _worker(worker_id: int) -> None:
+    """Consome a fila e processa os payloads pelo grafo.
+
+    A cada despertar, retira também o que já estiver na fila (até
+    _WORKER_BATCH_SIZE) sem voltar ao event loop, e processa tudo junto.
+    Com o consumo pausado (SIGUSR1), espera a retomada antes de ler a fila.
+    """
+    global _active_messages
+    while True:
+        await _consuming.wait()
+        batch = [await _queue.get()]
+        while len(batch) < _WORKER_BATCH_SIZE:
+            try:
+                batch.append(_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+
+        count = sum(len(messages) for _, messages, _ in batch)
+        _active_messages += count
+        try:
+            await process_message(batch)
+            # Só confirma no Redis o que terminou de rodar: se o worker for
+            # cancelado (timeout do shutdown), os itens ficam na lista de
+            # processamento e voltam para a fila no próximo reap
+            receipts = [receipt for *_, receipt in batch if receipt is not None]
+            if receipts:
+                await _durable.ack(receipts)
+        finally:
+            _active_messages -= count
+            for _ in batch:
+                _queue.task_done()
+
+
+def _pause_consuming() -> None:
+    _consuming.clear()
+    logger.warning("Consumo da fila pausado (SIGUSR1)")
+
+
+def _resume_consuming() -> None:
+    _consuming.set()
+    logger.warning("Consumo da fila retomado (SIGUSR2)")
+
+
+def _install_pause_signals() -> None:
+    """SIGUSR1 pausa e SIGUSR2 retoma os workers (só em POSIX)."""
+    if not hasattr(signal, "SIGUSR1"):
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGUSR1, _pause_consuming)
+        loop.add_signal_handler(signal.SIGUSR2, _resume_consuming)
+    except (NotImplementedError, RuntimeError):
+        # Loop sem suporte a sinais ou fora da thread principal (ex: testes)
+        logger.debug("Sinais de pausa/retomada indisponíveis neste loop")
+
+
+async def startup_event() -> None:
+    """Compila o grafo e inicia os workers que consomem a fila de mensagens."""
+    global _cluster_slots, _consuming, _durable, _feeder_task, _graph_slots
+    global _queue, _redis, workflow
+    started = time.perf_counter()
+    workflow = compile_graph()
+    logger.info("Grafo compilado em %.1f ms", (time.perf_counter() - started) * 1000)
+    _queue = asyncio.Queue(maxsize=get_settings().QUEUE_MAX_SIZE)
+    _graph_slots = asyncio.Semaphore(get_settings().MAX_CONCURRENT_RUNS)
+
+    _consuming = asyncio.Event()
+    _consuming.set()
+    _install_pause_signals()
+
+    # Executor padrão do asyncio.to_thread (HMAC de payloads grandes, pydub)
+    # com threads nomeadas, identificáveis em tracebacks e no py-spy
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(thread_name_prefix="offload")
+    )
+
+    redis_url = get_settings().REDIS_URL
+    if redis_url:
+        import redis.asyncio as aioredis
+
+        _redis = aioredis.from_url(
+            redis_url,
+            socket_connect_timeout=_REDIS_TIMEOUT,
+            socket_timeout=_REDIS_TIMEOUT,
+        )
+        logger.info("Deduplicação via Redis habilitada")
+    elif get_settings().UVICORN_WORKERS > 1:
+        logger.warning(
+            "UVICORN_WORKERS > 1 sem REDIS_URL — deduplicação é por processo"
         )
-        messages = value.get("messages", [])
-        sender = messages[0].get("from", "unknown") if messages else "unknown"
 
-        logger.info("Processando mensagem de %s", sender)
+    cluster_limit = get_settings().REDIS_MAX_CONCURRENT_RUNS
+    if cluster_limit > 0:
+        if _redis is None:
+            logger.error("REDIS_MAX_CONCURRENT_RUNS requer REDIS_URL — ignorado")
+        else:
+            _cluster_slots = RedisSemaphore(
+                _redis, "graph-runs", cluster_limit, _CLUSTER_SLOT_LEASE_SECONDS
+            )
+            logger.info("Limite global de %d execuções via Redis", cluster_limit)
+
+    if get_settings().REDIS_QUEUE:
+        if _redis is None:
+            logger.error("REDIS_QUEUE requer REDIS_URL — usando fila em memória")
+        else:
+            feeder_redis = aioredis.from_url(
+                redis_url,
+                socket_connect_timeout=_REDIS_TIMEOUT,
+                socket_timeout=_REDIS_FEEDER_TIMEOUT,
+            )
+            durable = DurableQueue(_redis, feeder_redis)
+            try:
+                await durable.start()
+                await durable.reap()
+            except Exception as e:
+                # Redis fora do ar no startup: como nos demais usos do Redis,
+                # degrada para a fila em memória em vez de derrubar o processo
+                logger.error("Fila durável indisponível, usando fila em memória: %s", e)
+                await durable.close()
+            else:
+                _durable = durable
+                _feeder_task = asyncio.create_task(
+                    _durable.feed(_queue), name="redis-feeder"
+                )
+                _worker_tasks.append(
+                    asyncio.create_task(_durable.reap_forever(), name="redis-reaper")
+                )
+                logger.info("Fila durável no Redis (consumidor %s)", _durable.consumer)
+
+    concurrency = get_settings().WORKER_CONCURRENCY
+    for worker_id in range(concurrency):
+        _worker_tasks.append(
+            asyncio.create_task(_worker(worker_id), name=f"worker-{worker_id}")
+        )
+    _worker_tasks.append(asyncio.create_task(_dedup_janitor(), name="dedup-janitor"))
+    logger.info("%d workers iniciados", concurrency)
 
-        result = await workflow.ainvoke(initial_state)
 
-        logger.info(
-            "Processamento concluído. Rationale: %s",
-            "presente" if result.get("rationale") else "ausente",
+async def shutdown_event() -> None:
+    """Drena a fila (com timeout) e encerra os workers e tasks pendentes."""
+    # Para de puxar do Redis; o que ficar sem ack é recuperado por outro
+    # consumidor (ou pelo próximo processo) após o heartbeat sumir
+    if _feeder_task is not None:
+        _feeder_task.cancel()
+        await asyncio.gather(_feeder_task, return_exceptions=True)
+
+    # Workers pausados não drenariam a fila
+    _consuming.set()
+    try:
+        await asyncio.wait_for(_queue.join(), timeout=_SHUTDOWN_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(
+            "Timeout ao drenar a fila — %d payloads descartados", _queue.qsize()
         )
 
-    except Exception:
-        logger.exception("Erro ao processar mensagem")
+    for task in _worker_tasks:
+        task.cancel()
+    await asyncio.gather(*_worker_tasks, return_exceptions=True)
+    _worker_tasks.clear()
+
+    # Indicadores de digitação ainda em voo (evita "Task was destroyed but
+    # it is pending" ao fechar o loop)
+    await whatsapp_api.cancel_background_tasks()
+
+    if _durable is not None:
+        await _durable.close()
+    if _redis is not None:
+        await _redis.aclose()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Ciclo de vida do processo (substitui o on_event, depreciado)."""
+    await startup_event()
+    try:
+        yield
+    finally:
+        await shutdown_event()
+
+
+# Criado aqui (e não na seção App) porque recebe o lifespan acima
+app = FastAPI(
+    title="TaCertoIssoAI - Fake News Detector",
+    description="Bot de detecção de fake news para WhatsApp via LangGraph",
+    version="2.0.0",
+    default_response_class=JSONBytesResponse,
+    lifespan=lifespan,
+)
 
 
 # ──────────────────────── Endpoints ────────────────────────
 
+# Corpos constantes serializados uma única vez. A Response em si é criada a
+# cada requisição: o Starlette envia a lista de headers por referência e um
+# middleware que a altere acumularia estado se a instância fosse reutilizada.
+_RECEIVED_BYTES = orjson.dumps({"status": "received"})
+_OK_BYTES = orjson.dumps({"status": "ok"})
+_FORBIDDEN_BYTES = orjson.dumps({"error": "Forbidden"})
+_INVALID_SIGNATURE_BYTES = orjson.dumps({"error": "Invalid signature"})
+_INVALID_PAYLOAD_BYTES = orjson.dumps({"error": "Invalid payload"})
+_BUSY_BYTES = orjson.dumps({"error": "Busy"})
+
+# Espera máxima (s) por vaga na fila cheia antes de responder 503
+_ENQUEUE_TIMEOUT = 0.05
+
+# Métricas de pressão da fila (expostas no /health para ajustar
+# QUEUE_MAX_SIZE/WORKER_CONCURRENCY): maior profundidade vista e webhooks
+# recusados com 503
+_queue_high_water = 0
+_rejected_busy = 0
+
+
+# Eventos da Cloud API que não são mensagens do usuário: descartados no
+# webhook, sem ocupar a fila nem responder "documento não suportado".
+# "unsupported"/"unknown" (enquete, visualização única...) seguem para o
+# grafo: o usuário recebe a confirmação de leitura e a orientação de envio.
+_SKIP_TYPES: frozenset[str] = frozenset(
+    {"reaction", "system", "ephemeral", "request_welcome"}
+)
+
+
+def _iter_messages(body: WebhookBody) -> Iterator[tuple[int, int, int, Message]]:
+    """Percorre todas as mensagens do webhook numa só sequência plana.
+
+    Gera (entry_idx, change_idx, msg_idx, message); mudanças sem mensagens
+    (eventos de status: delivered, read...) são ignoradas.
+    """
+    for entry_idx, entry in enumerate(body.entry):
+        for change_idx, change in enumerate(entry.changes):
+            for msg_idx, message in enumerate(change.value.messages):
+                yield entry_idx, change_idx, msg_idx, message
+
+
+def _json_bytes(content: bytes, status_code: int = 200) -> Response:
+    """Resposta JSON a partir de bytes já serializados."""
+    return Response(
+        content=content, status_code=status_code, media_type="application/json"
+    )
+
 
 @app.get("/webhook", response_model=None)
 async def webhook_verify(
@@ -119,79 +638,146 @@ async def webhook_verify(
     token = request.query_params.get("hub.verify_token", "")
     challenge = request.query_params.get("hub.challenge", "")
 
-    if mode == "subscribe" and token == config.WHATSAPP_VERIFY_TOKEN:
+    # Comparação em tempo constante (não vaza o token por timing)
+    if mode == "subscribe" and hmac.compare_digest(
+        token.encode("utf-8"), _VERIFY_TOKEN_BYTES
+    ):
         logger.info("Webhook verificado com sucesso")
         return PlainTextResponse(content=challenge, status_code=200)
 
     logger.warning("Falha na verificação do webhook (token inválido)")
-    return JSONResponse(content={"error": "Forbidden"}, status_code=403)
+    return _json_bytes(_FORBIDDEN_BYTES, 403)
 
 
 @app.post("/webhook")
-async def webhook_receive(
-    request: Request, background_tasks: BackgroundTasks
-) -> JSONResponse:
+async def webhook_receive(request: Request) -> Response:
     """Endpoint webhook que recebe mensagens da WhatsApp Cloud API.
 
-    Valida a assinatura X-Hub-Signature-256 e processa a mensagem em background.
+    Valida a assinatura X-Hub-Signature-256 e enfileira a mensagem para os
+    workers. Responde 503 se a fila estiver cheia (a Meta reenvia depois).
     """
+    global _queue_high_water, _rejected_busy
     payload = await request.body()
 
     # Validar assinatura
-    signature = request.headers.get("X-Hub-Signature-256", "")
-    if not _verify_signature(payload, signature):
+    signature = _get_signature_header(request.scope)
+    if not await _verify_signature(payload, signature):
         logger.warning("Assinatura inválida no webhook")
-        return JSONResponse(content={"error": "Invalid signature"}, status_code=403)
+        return _json_bytes(_INVALID_SIGNATURE_BYTES, 403)
 
-    body = await request.json()
+    # Eventos de status (a maioria do tráfego) são ignorados sem parse
+    if get_settings().SKIP_STATUS_EVENTS and _is_status_only(payload):
+        return _json_bytes(_OK_BYTES)
+
+    # Decodifica só os campos de roteamento (msgspec, direto dos bytes);
+    # o dict completo para o grafo é montado pelo worker.
+    try:
+        body = decoder.decode(payload)
+    except msgspec.DecodeError:
+        logger.warning("Payload inválido no webhook")
+        return _json_bytes(_INVALID_PAYLOAD_BYTES, 400)
 
     # A Cloud API envia vários tipos de evento; só processamos mensagens
-    entries = body.get("entry", [])
-    if not entries:
-        return JSONResponse(content={"status": "ok"}, status_code=200)
-
-    for entry in entries:
-        for change in entry.get("changes", []):
-            value = change.get("value", {})
-            messages = value.get("messages", [])
-
-            if not messages:
-                # Pode ser evento de status (delivered, read), ignorar
-                statuses = value.get("statuses", [])
-                if statuses:
-                    logger.debug("Evento de status recebido, ignorando")
-                continue
-
-            message = messages[0]
-            sender = message.get("from", "unknown")
-            msg_type = message.get("type", "unknown")
-
-            logger.info(
+    if not body.entry:
+        return _json_bytes(_OK_BYTES)
+
+    messages: list[MessageRef] = []
+    now = time.monotonic()
+    for entry_idx, change_idx, msg_idx, message in _iter_messages(body):
+        if message.type in _SKIP_TYPES:
+            continue
+        if message.id and await _is_duplicate(message.id, now):
+            logger.debug("Mensagem duplicada ignorada — id=%s", message.id)
+            continue
+
+        sender = message.sender or "unknown"
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
                 "Webhook recebido — de=%s, tipo=%s",
                 sender,
-                msg_type,
+                message.type or "unknown",
             )
-
-            # Processa em background para responder rapidamente ao webhook
-            background_tasks.add_task(process_message, body)
-
-    return JSONResponse(content={"status": "received"}, status_code=200)
+        messages.append((entry_idx, change_idx, msg_idx, message.id, sender))
+
+    # Com a fila durável, o ACK só sai depois de o payload estar no Redis.
+    # Sem conexão com o Redis, segue pela fila em memória. Qualquer outra
+    # falha (ex: timeout) pode ter gravado o item: em vez de duplicá-lo na
+    # fila local, responde 503 e deixa a Meta reenviar.
+    if messages and _durable is not None:
+        try:
+            await _durable.push(payload, messages)
+            return _json_bytes(_RECEIVED_BYTES)
+        except _durable.connection_error as e:
+            logger.warning("Falha ao gravar no Redis, usando fila local: %s", e)
+        except Exception as e:
+            logger.error("Falha ao gravar no Redis — mensagem recusada: %s", e)
+            _rejected_busy += 1
+            await _forget_messages([ref[3] for ref in messages])
+            return _json_bytes(_BUSY_BYTES, 503)
+
+    # Enfileira uma vez por webhook e responde rapidamente. Com a fila cheia,
+    # espera um instante por vaga (backpressure) antes de recusar com 503.
+    if messages:
+        item = (payload, messages, None)
+        try:
+            _queue.put_nowait(item)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(_queue.put(item), timeout=_ENQUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error("Fila cheia (%d) — mensagem recusada", _queue.maxsize)
+                _rejected_busy += 1
+                # A Meta vai reenviar: o reenvio não pode cair na deduplicação
+                await _forget_messages([ref[3] for ref in messages])
+                return _json_bytes(_BUSY_BYTES, 503)
+
+        depth = _queue.qsize()
+        if depth > _queue_high_water:
+            _queue_high_water = depth
+
+    return _json_bytes(_RECEIVED_BYTES)
 
 
 @app.get("/health")
-async def health_check() -> JSONResponse:
-    """Health check endpoint."""
-    return JSONResponse(content={"status": "ok"}, status_code=200)
+async def health_check() -> Response:
+    """Health check endpoint (inclui mensagens em processamento e na fila)."""
+    return JSONBytesResponse(
+        {
+            "status": "ok",
+            "active_tasks": _active_messages,
+            "running": _running_graphs,
+            "paused": _consuming is not None and not _consuming.is_set(),
+            "queued": _queue.qsize() if _queue is not None else 0,
+            "queue_high_water": _queue_high_water,
+            "rejected_busy": _rejected_busy,
+        },
+        status_code=200,
+    )
 
 
 # ──────────────────────── Main ────────────────────────
 
 if __name__ == "__main__":
-    logger.info("Iniciando servidor na porta %d...", config.WEBHOOK_PORT)
+    import uvicorn
+
+    settings = get_settings()
+    logger.info("Iniciando servidor na porta %d...", settings.WEBHOOK_PORT)
+    # Com um processo, passa o próprio app: a string "main:app" faria o
+    # uvicorn importar este arquivo de novo como ``main`` (além de
+    # ``__main__``), repetindo config, logging, HMAC e os imports do grafo.
+    # Com vários processos a string é obrigatória (cada um importa o app).
     uvicorn.run(
-        "main:app",
+        app if settings.UVICORN_WORKERS == 1 else "main:app",
         host="0.0.0.0",
-        port=config.WEBHOOK_PORT,
+        port=settings.WEBHOOK_PORT,
+        # "auto" usa uvloop/httptools (C) quando instalados — sempre no
+        # Linux/Docker — e cai no asyncio/h11 no Windows, onde não há uvloop.
+        loop="auto",
+        http="auto",
+        workers=settings.UVICORN_WORKERS,
+        # Maior que o idle timeout típico de load balancers (60s)
+        timeout_keep_alive=65,
+        limit_concurrency=1000,
         reload=False,
-        log_level="info",
+        log_level=settings.LOG_LEVEL.lower(),
     )
@@ -1 +1,50 @@
-"""Módulos dos nós do workflow LangGraph."""
+"""Módulos dos nós do workflow LangGraph.
+
+Os nós são expostos de forma preguiçosa (PEP 562): o submódulo só é
+importado quando o nome é acessado pela primeira vez.
+"""
+
+import importlib
+
+_LAZY: dict[str, str] = {
+    # Extração
+    "extract_data": "nodes.data_extractor",
+    # Filtros
+    "check_greeting": "nodes.filters",
+    "check_initial_message": "nodes.filters",
+    "check_is_on_group": "nodes.filters",
+    "route_greeting": "nodes.filters",
+    "route_initial_message": "nodes.filters",
+    "route_is_on_group": "nodes.filters",
+    # Processamento de mídia
+    "process_audio": "nodes.media_processor",
+    "process_image": "nodes.media_processor",
+    "process_text": "nodes.media_processor",
+    "process_video": "nodes.media_processor",
+    # Resposta
+    "handle_document_unsupported": "nodes.response_sender",
+    "handle_greeting": "nodes.response_sender",
+    "mark_as_read_node": "nodes.response_sender",
+    "send_audio_response": "nodes.response_sender",
+    "send_rationale_text": "nodes.response_sender",
+    # Roteamento
+    "route_direct_message": "nodes.router",
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name: str):
+    """Importa o submódulo do nó sob demanda e memoriza o atributo."""
+    module_name = _LAZY.get(name)
+    if module_name is None:
+        # Deixa o mecanismo de import resolver submódulos (ex: nodes.whatsapp_api)
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY))
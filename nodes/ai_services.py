@@ -12,9 +12,11 @@ import base64
 import io
 import logging
 import tempfile
+from functools import lru_cache
 from pathlib import Path
 
 import httpx
+import orjson
 
 import config
 
@@ -24,8 +26,13 @@ logger = logging.getLogger(__name__)
 # ──────────────────────── Gemini Client (lazy) ────────────────────────
 
 
+@lru_cache(maxsize=1)
 def _get_gemini_client():
-    """Retorna um cliente Gemini (criado sob demanda)."""
+    """Retorna o cliente Gemini do processo (criado sob demanda, reutilizado).
+
+    As chamadas usam a interface assíncrona (``client.aio``): o SDK síncrono
+    bloquearia o event loop durante toda a requisição ao Gemini.
+    """
     from google import genai
 
     return genai.Client(api_key=config.GOOGLE_GEMINI_API_KEY)
@@ -52,7 +59,7 @@ async def transcribe_audio(audio_base64: str) -> str:
     client = _get_gemini_client()
     audio_bytes = base64.b64decode(audio_base64)
 
-    response = client.models.generate_content(
+    response = await client.aio.models.generate_content(
         model=config.GEMINI_TRANSCRIPTION_MODEL,
         contents=[
             types.Part.from_bytes(data=audio_bytes, mime_type="audio/mp3"),
@@ -96,7 +103,7 @@ async def generate_tts(text: str) -> bytes:
 
     client = _get_gemini_client()
 
-    response = client.models.generate_content(
+    response = await client.aio.models.generate_content(
         model=config.GEMINI_TTS_MODEL,
         contents=text,
         config=types.GenerateContentConfig(
@@ -146,14 +153,15 @@ async def analyze_video(video_base64: str) -> str:
     """
     client = _get_gemini_client()
 
-    video_bytes = base64.b64decode(video_base64)
+    # Vídeo de vários MB: decodificar fora do event loop
+    video_bytes = await asyncio.to_thread(base64.b64decode, video_base64)
 
     with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
         tmp.write(video_bytes)
         tmp_path = Path(tmp.name)
 
     try:
-        uploaded_file = client.files.upload(file=tmp_path)
+        uploaded_file = await client.aio.files.upload(file=tmp_path)
 
         # Aguardar até o arquivo ficar ACTIVE (processamento do Gemini)
         max_wait = 60  # segundos
@@ -176,11 +184,11 @@ async def analyze_video(video_base64: str) -> str:
             )
             await asyncio.sleep(poll_interval)
             waited += poll_interval
-            uploaded_file = client.files.get(name=uploaded_file.name)
+            uploaded_file = await client.aio.files.get(name=uploaded_file.name)
 
         logger.info("Arquivo de vídeo pronto (estado: ACTIVE)")
 
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model=config.GEMINI_VIDEO_MODEL,
             contents=[uploaded_file, VIDEO_ANALYSIS_PROMPT],
         )
@@ -235,7 +243,7 @@ async def analyze_image_content(image_base64: str) -> str:
 
     image_bytes = base64.b64decode(image_base64)
 
-    response = client.models.generate_content(
+    response = await client.aio.models.generate_content(
         model=config.GEMINI_IMAGE_MODEL,
         contents=[
             types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
@@ -337,7 +345,7 @@ async def reverse_image_search(image_base64: str) -> str:
                 headers={"Content-Type": "application/json"},
             )
             resp.raise_for_status()
-            result = resp.json()
+            result = orjson.loads(resp.content)
 
         parsed = _parse_web_detection(result)
         logger.info("Reverse image search concluída (%d chars)", len(parsed))
@@ -16,31 +16,30 @@ def _get_message_data(body: dict[str, Any]) -> dict[str, Any]:
     """Extrai o objeto de mensagem do payload da Cloud API.
 
     Estrutura: body.entry[0].changes[0].value
+
+    Indexação direta em try/except: a Meta sempre envia o envelope completo,
+    então o caminho feliz não aloca os defaults ([], {}) de cada .get().
     """
-    entries = body.get("entry", [])
-    if not entries:
-        return {}
-    changes = entries[0].get("changes", [])
-    if not changes:
+    try:
+        return body["entry"][0]["changes"][0]["value"]
+    except (KeyError, IndexError, TypeError):
         return {}
-    return changes[0].get("value", {})
 
 
 def _get_message(value: dict[str, Any]) -> dict[str, Any]:
     """Extrai o primeiro objeto de mensagem."""
-    messages = value.get("messages", [])
-    if not messages:
+    try:
+        return value["messages"][0]
+    except (KeyError, IndexError, TypeError):
         return {}
-    return messages[0]
 
 
-def _get_contact_name(value: dict[str, Any]) -> str:
+def _get_contact_name(contacts: list[dict[str, Any]]) -> str:
     """Extrai o nome do contato do payload."""
-    contacts = value.get("contacts", [])
-    if not contacts:
+    try:
+        return contacts[0]["profile"]["name"]
+    except (KeyError, IndexError, TypeError):
         return ""
-    profile = contacts[0].get("profile", {})
-    return profile.get("name", "")
 
 
 def _extract_text(message: dict[str, Any]) -> str:
@@ -99,9 +98,15 @@ def extract_data(state: WorkflowState) -> WorkflowState:
       }]
     }
     """
-    body = state["raw_body"]
-    value = _get_message_data(body)
-    message = _get_message(value)
+    # O webhook já entrega a mensagem e os contatos separados; raw_body
+    # fica como alternativa para quem invoca o grafo com o payload cru.
+    if "message" in state:
+        message = state["message"]
+        contacts = state.get("contacts", [])
+    else:
+        value = _get_message_data(state["raw_body"])
+        message = _get_message(value)
+        contacts = value.get("contacts", [])
 
     if not message:
         logger.warning("Nenhuma mensagem encontrada no payload")
@@ -126,7 +131,7 @@ def extract_data(state: WorkflowState) -> WorkflowState:
     extracted = {
         "endpoint_api": state.get("endpoint_api", ""),
         "numero_quem_enviou": message.get("from", ""),
-        "nome_quem_enviou": _get_contact_name(value),
+        "nome_quem_enviou": _get_contact_name(contacts),
         "mensagem": mensagem,
         "id_mensagem": message.get("id", ""),
         "stanza_id": stanza_id,
@@ -135,11 +140,12 @@ def extract_data(state: WorkflowState) -> WorkflowState:
         "caption": caption,
     }
 
-    logger.info(
-        "Dados extraídos — de=%s, tipo=%s, media_id=%s",
-        extracted["numero_quem_enviou"],
-        extracted["tipo_mensagem"],
-        extracted["media_id"] or "(nenhum)",
-    )
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Dados extraídos — de=%s, tipo=%s, media_id=%s",
+            extracted["numero_quem_enviou"],
+            extracted["tipo_mensagem"],
+            extracted["media_id"] or "(nenhum)",
+        )
 
     return extracted  # type: ignore[return-value]
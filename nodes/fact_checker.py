@@ -9,6 +9,7 @@ Todos chamam o endpoint POST /text com payloads diferentes.
 import logging
 
 import httpx
+import orjson
 
 logger = logging.getLogger(__name__)
 
@@ -49,7 +50,7 @@ async def check_text(
             headers={"Content-Type": "application/json"},
         )
         resp.raise_for_status()
-        result = resp.json()
+        result = orjson.loads(resp.content)
         logger.info("Fact-check resultado recebido")
         return result
 
@@ -85,6 +86,6 @@ async def check_content(
             headers={"Content-Type": "application/json"},
         )
         resp.raise_for_status()
-        result = resp.json()
+        result = orjson.loads(resp.content)
         logger.info("Fact-check (multi) resultado recebido")
         return result
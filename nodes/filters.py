@@ -11,30 +11,32 @@ from state import WorkflowState
 
 logger = logging.getLogger(__name__)
 
-# Lista de saudações (mesma do n8n Code in JavaScript1)
-GREETINGS = [
-    "oi",
-    "ola",
-    "eai",
-    "iae",
-    "iai",
-    "fala",
-    "fala ai",
-    "fala ae",
-    "bom dia",
-    "boa tarde",
-    "boa noite",
-    "opa",
-    "salve",
-    "alo",
-    "oii",
-    "oiii",
-    "ola tudo bem",
-    "oi tudo bem",
-    "bom dia tudo bem",
-    "boa tarde tudo bem",
-    "boa noite tudo bem",
-]
+# Saudações (mesma lista do n8n Code in JavaScript1); frozenset para busca O(1)
+GREETINGS = frozenset(
+    {
+        "oi",
+        "ola",
+        "eai",
+        "iae",
+        "iai",
+        "fala",
+        "fala ai",
+        "fala ae",
+        "bom dia",
+        "boa tarde",
+        "boa noite",
+        "opa",
+        "salve",
+        "alo",
+        "oii",
+        "oiii",
+        "ola tudo bem",
+        "oi tudo bem",
+        "bom dia tudo bem",
+        "boa tarde tudo bem",
+        "boa noite tudo bem",
+    }
+)
 
 
 def _normalize_text(text: str) -> str:
@@ -56,7 +58,7 @@ def check_is_on_group(state: WorkflowState) -> WorkflowState:
     # Na Cloud API, o número de quem enviou é simplesmente o telefone (ex: '5511999999999')
     # Não há sufixo @g.us como na Evolution API
     is_group = False
-    logger.info("isOnGroup: %s", is_group)
+    logger.debug("isOnGroup: %s", is_group)
     return {"is_group": is_group}  # type: ignore[return-value]
 
 
@@ -141,7 +143,7 @@ def check_initial_message(state: WorkflowState) -> WorkflowState:
     """Verifica se é a mensagem inicial do bot (contém link de termos)."""
     mensagem = state.get("mensagem", "")
     is_initial = "tacertoissoai.com.br/termos-e-privacidade" in mensagem
-    logger.info("isInitialMessage: %s", is_initial)
+    logger.debug("isInitialMessage: %s", is_initial)
     return {"is_initial_message": is_initial}  # type: ignore[return-value]
 
 
@@ -157,7 +159,7 @@ def check_greeting(state: WorkflowState) -> WorkflowState:
     mensagem = state.get("mensagem", "")
     normalized = _normalize_text(mensagem)
     is_greeting = normalized in GREETINGS
-    logger.info("isGreeting: %s (normalized='%s')", is_greeting, normalized)
+    logger.debug("isGreeting: %s (normalized='%s')", is_greeting, normalized)
     return {"is_greeting": is_greeting}  # type: ignore[return-value]
 
 
@@ -11,6 +11,7 @@ Adaptado para a WhatsApp Business Cloud API.
 Funções de mensagens citadas em grupo (Switch9) comentadas.
 """
 
+import asyncio
 import base64
 import logging
 import struct
@@ -244,9 +245,10 @@ async def process_video(state: WorkflowState) -> WorkflowState:
     # 2. Download da mídia e converter para base64
     video_b64 = await whatsapp_api.download_media_as_base64(media_id)
 
-    # 3. Verificar duração (máx 2 minutos = 120 segundos)
+    # 3. Verificar duração (máx 2 minutos = 120 segundos). Decodificar e
+    # varrer vídeos de vários MB é CPU puro: roda fora do event loop.
     try:
-        duration = get_video_duration_from_base64(video_b64)
+        duration = await asyncio.to_thread(get_video_duration_from_base64, video_b64)
     except Exception:
         duration = 0
 
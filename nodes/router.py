@@ -11,6 +11,20 @@ from state import WorkflowState
 logger = logging.getLogger(__name__)
 
 
+# Tipo de mensagem → nó de processamento (montado uma vez, não a cada mensagem)
+_DIRECT_ROUTES: dict[str, str] = {
+    "audio": "process_audio",
+    "text": "process_text",
+    "image": "process_image",
+    "sticker": "process_image",
+    "video": "process_video",
+    "document": "handle_document_unsupported",
+    # Tipos interativos tratados como texto
+    "interactive": "process_text",
+    "button": "process_text",
+}
+
+
 def route_direct_message(state: WorkflowState) -> str:
     """Switch6: Roteia mensagens diretas pelo tipo de mensagem.
 
@@ -18,22 +32,10 @@ def route_direct_message(state: WorkflowState) -> str:
     Sticker é tratado como imagem.
     """
     tipo = state.get("tipo_mensagem", "")
-    logger.info("Switch6 — tipo_mensagem: %s", tipo)
-
-    mapping = {
-        "audio": "process_audio",
-        "text": "process_text",
-        "image": "process_image",
-        "sticker": "process_image",
-        "video": "process_video",
-        "document": "handle_document_unsupported",
-        # Tipos interativos tratados como texto
-        "interactive": "process_text",
-        "button": "process_text",
-    }
-
-    route = mapping.get(tipo, "handle_document_unsupported")
-    logger.info("Switch6 — rota selecionada: %s", route)
+    logger.debug("Switch6 — tipo_mensagem: %s", tipo)
+
+    route = _DIRECT_ROUTES.get(tipo, "handle_document_unsupported")
+    logger.debug("Switch6 — rota selecionada: %s", route)
     return route
 
 
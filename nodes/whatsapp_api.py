@@ -13,6 +13,7 @@ import base64
 import logging
 
 import httpx
+import orjson
 
 import config
 
@@ -20,6 +21,10 @@ logger = logging.getLogger(__name__)
 
 _TIMEOUT = httpx.Timeout(60.0, connect=10.0)
 
+# Referências fortes às tasks fire-and-forget (o event loop só guarda
+# referências fracas; sem isso a task pode ser coletada no meio do envio)
+_background_tasks: set[asyncio.Task] = set()
+
 
 def _messages_url() -> str:
     """URL base para enviar mensagens."""
@@ -70,7 +75,7 @@ async def send_text(
         resp = await client.post(_messages_url(), json=body, headers=_headers())
         resp.raise_for_status()
         logger.info("Texto enviado para %s", remote_jid)
-        return resp.json()
+        return orjson.loads(resp.content)
 
 
 # ──────────────────────── Upload de Mídia ────────────────────────
@@ -106,7 +111,7 @@ async def upload_media(
     async with httpx.AsyncClient(timeout=_TIMEOUT) as client:
         resp = await client.post(url, headers=headers, files=files, data=data)
         resp.raise_for_status()
-        result = resp.json()
+        result = orjson.loads(resp.content)
         media_id = result.get("id", "")
         logger.info("Mídia uploaded — media_id=%s", media_id)
         return media_id
@@ -148,7 +153,7 @@ async def send_audio(
         resp = await client.post(_messages_url(), json=body, headers=_headers())
         resp.raise_for_status()
         logger.info("Áudio enviado para %s (media_id=%s)", remote_jid, media_id)
-        return resp.json()
+        return orjson.loads(resp.content)
 
 
 # ──────────────────────── Marcar como Lida ────────────────────────
@@ -170,7 +175,7 @@ async def mark_as_read(message_id: str) -> dict:
         resp = await client.post(_messages_url(), json=body, headers=_headers())
         resp.raise_for_status()
         logger.info("Mensagem %s marcada como lida", message_id)
-        return resp.json()
+        return orjson.loads(resp.content)
 
 
 # ──────────────────────── Download de Mídia ────────────────────────
@@ -193,7 +198,7 @@ async def download_media(media_id: str) -> bytes:
         # 1. Obter URL de download
         resp = await client.get(_media_url(media_id), headers=auth_header)
         resp.raise_for_status()
-        media_info = resp.json()
+        media_info = orjson.loads(resp.content)
         download_url = media_info.get("url", "")
 
         if not download_url:
@@ -214,6 +219,14 @@ async def download_media(media_id: str) -> bytes:
         return media_bytes
 
 
+# Acima deste tamanho (bytes) o base64 da mídia é calculado numa thread
+_B64_INLINE_MAX_BYTES = 256 * 1024
+
+
+def _b64encode_str(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
 async def download_media_as_base64(media_id: str) -> str:
     """Baixa mídia e retorna como base64.
 
@@ -227,7 +240,10 @@ async def download_media_as_base64(media_id: str) -> str:
         String base64 da mídia.
     """
     media_bytes = await download_media(media_id)
-    return base64.b64encode(media_bytes).decode("utf-8")
+    if len(media_bytes) > _B64_INLINE_MAX_BYTES:
+        # Vídeos/áudios de vários MB: codificar no loop atrasaria os ACKs
+        return await asyncio.to_thread(_b64encode_str, media_bytes)
+    return _b64encode_str(media_bytes)
 
 
 # ──────────────────────── Indicador de Digitação ────────────────────────
@@ -265,4 +281,14 @@ def send_typing_fire_and_forget(message_id: str) -> None:
 
     Equivalente ao send_presence_fire_and_forget da Evolution API.
     """
-    asyncio.create_task(send_typing_indicator(message_id))
+    task = asyncio.create_task(send_typing_indicator(message_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def cancel_background_tasks() -> None:
+    """Cancela as tasks fire-and-forget pendentes (usado no shutdown)."""
+    tasks = list(_background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
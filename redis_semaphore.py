@@ -0,0 +1,85 @@
+"""Semáforo distribuído no Redis (opcional, REDIS_MAX_CONCURRENT_RUNS).
+
+Limita as execuções simultâneas do grafo somando todos os processos e
+réplicas, para que mais workers do uvicorn não multipliquem a carga sobre
+Gemini/fact-check. Cada vaga é um membro de um ZSET com o horário de
+aquisição como score; vagas mais antigas que o lease (processo que morreu
+sem liberar) são descartadas na próxima tentativa de aquisição.
+
+Se o Redis falhar, a execução segue sem a vaga global: o limite por
+processo (MAX_CONCURRENT_RUNS) continua valendo.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Remove vagas vencidas e ocupa uma se houver espaço (atômico no Redis).
+# O horário vem do próprio servidor (TIME): relógios diferentes entre as
+# réplicas não podem descartar vagas vivas nem manter vagas mortas.
+_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[2]))
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# Espera (s) entre tentativas quando não há vaga: cresce até o máximo
+_RETRY_MIN = 0.05
+_RETRY_MAX = 1.0
+
+
+class RedisSemaphore:
+    """Semáforo contável compartilhado via ZSET (``async with sem.slot(): ...``)."""
+
+    def __init__(self, redis, name: str, limit: int, lease_seconds: int) -> None:
+        self._redis = redis
+        self._key = f"semaphore:{name}"
+        self._limit = limit
+        self._lease = lease_seconds
+        self._acquire = redis.register_script(_ACQUIRE_SCRIPT)
+
+    async def acquire(self) -> str | None:
+        """Espera por uma vaga; retorna o token dela (None se o Redis falhou)."""
+        token = uuid.uuid4().hex
+        delay = _RETRY_MIN
+        while True:
+            try:
+                acquired = await self._acquire(
+                    keys=[self._key],
+                    args=[self._limit, self._lease, token],
+                )
+            except Exception as e:
+                logger.warning("Semáforo Redis indisponível, seguindo sem ele: %s", e)
+                return None
+            if acquired:
+                return token
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, _RETRY_MAX)
+
+    async def release(self, token: str | None) -> None:
+        if token is None:
+            return
+        try:
+            await self._redis.zrem(self._key, token)
+        except Exception as e:
+            # A vaga expira sozinha após o lease
+            logger.warning("Falha ao liberar vaga do semáforo Redis: %s", e)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Ocupa uma vaga durante o bloco ``async with``."""
+        token = await self.acquire()
+        try:
+            yield
+        finally:
+            await self.release(token)
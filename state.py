@@ -8,6 +8,9 @@ class WorkflowState(TypedDict, total=False):
 
     # Dados do webhook (raw)
     raw_body: dict[str, Any]
+    # Mensagem já localizada pelo webhook (dispensa percorrer raw_body)
+    message: dict[str, Any]
+    contacts: list[dict[str, Any]]
 
     # Dados extraídos (nó "Pegar dados")
     numero_quem_enviou: str
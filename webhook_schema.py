@@ -0,0 +1,43 @@
+"""Esquema tipado (msgspec) do webhook da WhatsApp Business Cloud API.
+
+Declara apenas os campos usados para rotear o webhook (remetente, id e
+tipo da mensagem). Os demais campos do payload são ignorados pelo
+decoder, sem criar dicts intermediários. O payload completo continua
+sendo decodificado como dict para o grafo, fora do caminho do ACK.
+
+As structs são imutáveis e sem rastreamento pelo GC (``gc=False``): não
+formam ciclos e vivem só durante a requisição.
+"""
+
+import msgspec
+
+
+class Message(msgspec.Struct, frozen=True, gc=False):
+    """Objeto de mensagem: value.messages[i]."""
+
+    id: str = ""
+    type: str = ""
+    sender: str = msgspec.field(name="from", default="")
+
+
+class Value(msgspec.Struct, frozen=True, gc=False):
+    """Conteúdo de uma mudança (só as mensagens interessam ao roteamento)."""
+
+    messages: list[Message] = []
+
+
+class Change(msgspec.Struct, frozen=True, gc=False):
+    value: Value = msgspec.field(default_factory=Value)
+
+
+class Entry(msgspec.Struct, frozen=True, gc=False):
+    changes: list[Change] = []
+
+
+class WebhookBody(msgspec.Struct, frozen=True, gc=False):
+    """Raiz do payload: {"object": ..., "entry": [...]}."""
+
+    entry: list[Entry] = []
+
+
+decoder = msgspec.json.Decoder(WebhookBody)